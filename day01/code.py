@@ -1,32 +1,121 @@
-import sys
-
-depths = []
-with open(sys.argv[1], "r") as f:
-    depths = [int(x) for x in f.readlines()]
-
-windows = [0 for i in range(len(depths) - 2)]
-for index, current_depth in enumerate(depths):
-    if index < len(windows):
-        windows[index] += current_depth
-    if index - 1 >= 0 and index - 1 < len(windows):
-        windows[index - 1] += current_depth
-    if index - 2 >= 0:
-        windows[index - 2] += current_depth
-
-last_depth = 100000000000000000
-increments = 0
-for current_depth in depths:
-    if current_depth > last_depth:
-        increments += 1
-    last_depth = current_depth
-
-print(f"Increments: {increments}")
-
-last_depth = 100000000000000000
-increments = 0
-for current_depth in windows:
-    if current_depth > last_depth:
-        increments += 1
-    last_depth = current_depth
-
-print(f"Window increments: {increments}")
\ No newline at end of file
+from __future__ import annotations
+import sys, os, numpy
+from collections import deque
+from multiprocessing import Pool
+from typing import Generator, Iterable, List, TextIO, Tuple
+
+filename = (
+    sys.argv[1]
+    if len(sys.argv) > 1
+    else os.path.join(os.path.dirname(os.path.abspath(__file__)), "testinput")
+)
+mode = sys.argv[2] if len(sys.argv) > 2 else "serial"
+WINDOW_SIZE = 3
+CHUNK_SIZE = 64 * 1024 * 1024
+
+
+def read_depths(f: TextIO) -> Generator[int]:
+    for line in f:
+        line = line.strip()
+        if line:
+            yield int(line)
+
+
+def count_increments(
+    depths: Iterable[int], window_size: int = WINDOW_SIZE
+) -> Tuple[int, int]:
+    # two neighboring windows share all but one reading, so comparing the window sums
+    # is the same as comparing x[i] with x[i-k]. We only need to remember the last k readings.
+    last_depths = deque(maxlen=window_size)
+    increments = 0
+    window_increments = 0
+    for current_depth in depths:
+        if len(last_depths) > 0 and current_depth > last_depths[-1]:
+            increments += 1
+        if len(last_depths) == window_size and current_depth > last_depths[0]:
+            window_increments += 1
+        last_depths.append(current_depth)
+    return increments, window_increments
+
+
+def get_chunk_boundaries(filename: str, chunk_size: int) -> List[Tuple[int, int]]:
+    # move every boundary forward to the next line start so no reading is split
+    filesize = os.path.getsize(filename)
+    boundaries = [0]
+    with open(filename, "rb") as f:
+        while boundaries[-1] < filesize:
+            f.seek(min(boundaries[-1] + chunk_size, filesize))
+            f.readline()
+            boundaries.append(min(f.tell(), filesize))
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def scan_chunk(
+    args: Tuple[str, int, int, int]
+) -> Tuple[int, int, List[int], List[int]]:
+    filename, start, end, window_size = args
+    with open(filename, "rb") as f:
+        f.seek(start)
+        # split() skips blank lines like read_depths does, a chunk of only blank
+        # lines gives no readings at all
+        depths = numpy.array(f.read(end - start).split(), dtype=numpy.int64)
+
+    increments = int(numpy.count_nonzero(depths[1:] > depths[:-1]))
+    window_increments = int(
+        numpy.count_nonzero(depths[window_size:] > depths[:-window_size])
+    )
+    return (
+        increments,
+        window_increments,
+        depths[:window_size].tolist(),
+        depths[-window_size:].tolist(),
+    )
+
+
+def count_increments_parallel(
+    filename: str,
+    window_size: int = WINDOW_SIZE,
+    chunk_size: int = CHUNK_SIZE,
+    processes: int = None,
+) -> Tuple[int, int]:
+    chunks = [
+        (filename, start, end, window_size)
+        for start, end in get_chunk_boundaries(filename, chunk_size)
+    ]
+    with Pool(processes) as pool:
+        results = pool.map(scan_chunk, chunks)
+
+    # each chunk only counted comparisons inside itself, the comparisons reaching
+    # back into previous chunks are done here with the last k readings seen so far
+    increments = 0
+    window_increments = 0
+    last_depths = []
+    for chunk_increments, chunk_window_increments, head, tail in results:
+        increments += chunk_increments
+        window_increments += chunk_window_increments
+        joined = last_depths + head
+        for index in range(len(last_depths), len(joined)):
+            if index == len(last_depths) and index > 0:
+                increments += joined[index] > joined[index - 1]
+            if index >= window_size:
+                window_increments += joined[index] > joined[index - window_size]
+        last_depths = (last_depths + tail)[-window_size:]
+    return increments, window_increments
+
+
+def main():
+    if mode == "parallel":
+        increments, window_increments = count_increments_parallel(filename)
+    elif filename == "-":
+        # "-" reads the readings from stdin
+        increments, window_increments = count_increments(read_depths(sys.stdin))
+    else:
+        with open(filename, "r") as f:
+            increments, window_increments = count_increments(read_depths(f))
+
+    print(f"Increments: {increments}")
+    print(f"Window increments: {window_increments}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,153 @@
-import sys
-
-commands = []
-with open(sys.argv[1], "r") as f:
-    for line in f.readlines():
-        command, value = line.split(" ")[0], line.split(" ")[1].strip()
-        commands.append((command, int(value)))
-
-horizontal_position = 0
-depth = 0
-
-for command, value in commands:
-    if command == "forward":
-        horizontal_position += value
-    elif command == "down":
-        depth += value
-    elif command == "up":
-        depth -= value
-    else:
-        print(f"unknown command {command} {value}")
+from __future__ import annotations
+import sys, os, numpy, functools
+from multiprocessing import Pool
+from typing import List, Tuple
 
-print(
-    f"01: HPos: {horizontal_position}, Depth: {depth}, Mul: {horizontal_position*depth}"
+filename = (
+    sys.argv[1]
+    if len(sys.argv) > 1
+    else os.path.join(os.path.dirname(os.path.abspath(__file__)), "testinput")
 )
+mode = sys.argv[2] if len(sys.argv) > 2 else "serial"
+CHUNK_SIZE = 64 * 1024 * 1024
+COMMANDS = {b"forward": 0, b"down": 1, b"up": 2}
+
+
+def parse_commands(data: bytes) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    tokens = numpy.array(data.split(), dtype=bytes).reshape(-1, 2)
+    opcodes = numpy.full(len(tokens), -1, dtype=numpy.int8)
+    for command, opcode in COMMANDS.items():
+        opcodes[tokens[:, 0] == command] = opcode
+    values = tokens[:, 1].astype(numpy.int64)
+
+    for command, value in tokens[opcodes == -1]:
+        print(f"unknown command {command.decode()} {value.decode()}")
+    return opcodes, values
+
+
+def get_deltas(
+    opcodes: numpy.ndarray, values: numpy.ndarray
+) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    forward = numpy.where(opcodes == COMMANDS[b"forward"], values, 0)
+    vertical = numpy.where(opcodes == COMMANDS[b"down"], values, 0) - numpy.where(
+        opcodes == COMMANDS[b"up"], values, 0
+    )
+    return forward, vertical
+
+
+def calculate_course(
+    opcodes: numpy.ndarray, values: numpy.ndarray
+) -> Tuple[int, int, int]:
+    forward, vertical = get_deltas(opcodes, values)
+    horizontal_position = int(forward.sum())
+    # part 1 moves the depth directly, part 2 uses the same deltas as aim
+    depth = int(vertical.sum())
+    aim_depth = int((forward * numpy.cumsum(vertical)).sum())
+    return horizontal_position, depth, aim_depth
+
+
+def calculate_trajectory(
+    opcodes: numpy.ndarray, values: numpy.ndarray
+) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    # position, depth and aim after every command (with aim like in part 2)
+    forward, vertical = get_deltas(opcodes, values)
+    aim = numpy.cumsum(vertical)
+    return numpy.cumsum(forward), numpy.cumsum(forward * aim), aim
+
+
+class CourseSummary:
+    # A chunk of commands moves the submarine by `horizontal`, changes the aim by `aim`
+    # and dives `depth` when started with aim 0. Started with aim a it dives
+    # depth + a * horizontal instead, which is all we need to chain chunks together.
+    horizontal: int
+    aim: int
+    depth: int
+
+    def __init__(self, horizontal: int = 0, aim: int = 0, depth: int = 0) -> None:
+        self.horizontal = horizontal
+        self.aim = aim
+        self.depth = depth
+
+    @classmethod
+    def from_commands(
+        cls, opcodes: numpy.ndarray, values: numpy.ndarray
+    ) -> CourseSummary:
+        return cls(*calculate_course(opcodes, values))
 
-horizontal_position = 0
-depth = 0
-aim = 0
-for command, value in commands:
-    if command == "forward":
-        horizontal_position += value
-        depth += aim * value
-    elif command == "down":
-        aim += value
-    elif command == "up":
-        aim -= value
+    @classmethod
+    def from_bytes(cls, data: bytes) -> CourseSummary:
+        return cls.from_commands(*parse_commands(data))
+
+    def combine(self, other: CourseSummary) -> CourseSummary:
+        return CourseSummary(
+            self.horizontal + other.horizontal,
+            self.aim + other.aim,
+            self.depth + other.depth + self.aim * other.horizontal,
+        )
+
+    def append(self, data: bytes) -> CourseSummary:
+        # continue from this summary as checkpoint without replaying older commands
+        return self.combine(CourseSummary.from_bytes(data))
+
+    def __eq__(self, other: CourseSummary) -> bool:
+        return (self.horizontal, self.aim, self.depth) == (
+            other.horizontal,
+            other.aim,
+            other.depth,
+        )
+
+    def __str__(self) -> str:
+        return f"CourseSummary(horizontal={self.horizontal}, aim={self.aim}, depth={self.depth})"
+
+
+def get_chunk_boundaries(filename: str, chunk_size: int) -> List[Tuple[int, int]]:
+    # move every boundary forward to the next line start so no command is split
+    filesize = os.path.getsize(filename)
+    boundaries = [0]
+    with open(filename, "rb") as f:
+        while boundaries[-1] < filesize:
+            f.seek(min(boundaries[-1] + chunk_size, filesize))
+            f.readline()
+            boundaries.append(min(f.tell(), filesize))
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def summarize_chunk(args: Tuple[str, int, int]) -> CourseSummary:
+    filename, start, end = args
+    with open(filename, "rb") as f:
+        f.seek(start)
+        return CourseSummary.from_bytes(f.read(end - start))
+
+
+def summarize_parallel(
+    filename: str, chunk_size: int = CHUNK_SIZE, processes: int = None
+) -> CourseSummary:
+    chunks = [
+        (filename, start, end)
+        for start, end in get_chunk_boundaries(filename, chunk_size)
+    ]
+    with Pool(processes) as pool:
+        summaries = pool.map(summarize_chunk, chunks)
+    return functools.reduce(CourseSummary.combine, summaries, CourseSummary())
+
+
+def main():
+    if mode == "parallel":
+        summary = summarize_parallel(filename)
     else:
-        print(f"unknown command {command} {value}")
+        with open(filename, "rb") as f:
+            summary = CourseSummary.from_bytes(f.read())
+
+    # without aim the vertical deltas directly change the depth
+    horizontal_position, depth = summary.horizontal, summary.aim
+    aim_depth, aim = summary.depth, summary.aim
+    print(
+        f"01: HPos: {horizontal_position}, Depth: {depth}, Mul: {horizontal_position*depth}"
+    )
+    print(
+        f"02: HPos: {horizontal_position}, Depth: {aim_depth}, Aim: {aim}, Mul: {horizontal_position*aim_depth}"
+    )
+
 
-print(
-    f"02: HPos: {horizontal_position}, Depth: {depth}, Aim: {aim}, Mul: {horizontal_position*depth}"
-)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,78 +1,96 @@
-import sys
+from __future__ import annotations
+import sys, os, numpy, itertools
 import logging
+from bisect import bisect_left
+from typing import BinaryIO, Generator, Iterable, List, Tuple
 
 logging.basicConfig(format="%(message)s", level=logging.INFO)
 
-bits = []
-numbers = []
-with open(sys.argv[1], "r") as f:
-    for line in f.readlines():
-        line = line.strip()
-        numbers.append(int(line, 2))
-        for index, bit in enumerate([char for char in line]):
-            if index >= len(bits):
-                bits.append([])
-            bits[index].append(bit)
-
-logging.debug(f"Bitlist: {bits}")
-logging.debug(f"Numbers: {numbers}")
-
-result = ""
-for bitlist in bits:
-    most_common_element = max(set(bitlist), key=bitlist.count)
-    result = f"{result}{most_common_element}"
-
-gammarate = int(result, 2)
-epsilonrate = (1 << (len(bits))) - 1 - gammarate
-logging.info(f"Gammarate: {gammarate}")
-logging.info(f"Epsilonrate: {epsilonrate}")
-logging.info(f"Multipilcation: {gammarate * epsilonrate}")
-
-o2_numbers = list(range(len(numbers)))
-co2_numbers = list(range(len(numbers)))
-logging.debug(f"O2: {o2_numbers}")
-logging.debug(f"CO2: {co2_numbers}")
-
-for search_index, bitlist in enumerate(bits):
-    if len(o2_numbers) > 1:
-        filtered_bitlist = [x for i, x in enumerate(bitlist) if i in o2_numbers]
-        zero_count = filtered_bitlist.count("0")
-        one_count = filtered_bitlist.count("1")
-
-        deletion_criteria = "1"
-        if zero_count > one_count:
-            deletion_criteria = "0"
-
-        deletion_indices = [i for i, x in enumerate(bitlist) if x != deletion_criteria]
-        for deletion_index in deletion_indices:
-            try:
-                o2_numbers.remove(deletion_index)
-            except:
-                pass
-        logging.debug(
-            f"O2 Counts: {zero_count}/{one_count} Bitcriteria: {deletion_criteria}, remove {deletion_indices}, remaining {o2_numbers}"
-        )
+filename = (
+    sys.argv[1]
+    if len(sys.argv) > 1
+    else os.path.join(os.path.dirname(os.path.abspath(__file__)), "testinput")
+)
+BLOCK_SIZE = 65536
+
+
+def read_bit_blocks(f: BinaryIO, block_size: int) -> Generator[numpy.ndarray]:
+    # rows as uint8 bit matrix, one block of rows at a time to keep the memory bounded
+    while True:
+        lines = [line.strip() for line in itertools.islice(f, block_size)]
+        lines = [line for line in lines if line]
+        if len(lines) == 0:
+            return
+        yield numpy.frombuffer(b"".join(lines), dtype=numpy.uint8).reshape(
+            len(lines), -1
+        ) - ord("0")
+
+
+def count_column_bits(blocks: Iterable[numpy.ndarray]) -> Tuple[numpy.ndarray, int]:
+    one_counts = None
+    rows = 0
+    for block in blocks:
+        block_counts = block.sum(axis=0, dtype=numpy.int64)
+        one_counts = block_counts if one_counts is None else one_counts + block_counts
+        rows += len(block)
+    return one_counts, rows
+
+
+def get_gamma_epsilon(one_counts: numpy.ndarray, rows: int) -> Tuple[int, int]:
+    most_common = "".join("1" if x * 2 >= rows else "0" for x in one_counts)
+    gammarate = int(most_common, 2)
+    epsilonrate = (1 << (len(one_counts))) - 1 - gammarate
+    return gammarate, epsilonrate
+
 
-for search_index, bitlist in enumerate(bits):
-    if len(co2_numbers) > 1:
-        filtered_bitlist = [x for i, x in enumerate(bitlist) if i in co2_numbers]
-        zero_count = filtered_bitlist.count("0")
-        one_count = filtered_bitlist.count("1")
-
-        deletion_criteria = "0"
-        if zero_count > one_count:
-            deletion_criteria = "1"
-
-        deletion_indices = [i for i, x in enumerate(bitlist) if x != deletion_criteria]
-        for deletion_index in deletion_indices:
-            try:
-                co2_numbers.remove(deletion_index)
-            except:
-                pass
+def get_rating(sorted_numbers: List[int], width: int, most_common: bool) -> int:
+    # All numbers left after filtering share their leading bits, so in the sorted list
+    # they are one range [lo, hi). The numbers with the next bit set are the upper part
+    # of that range, which we find by bisecting for the smallest number having it.
+    lo, hi = 0, len(sorted_numbers)
+    for bit in reversed(range(width)):
+        if hi - lo <= 1:
+            break
+
+        prefix = sorted_numbers[lo] >> (bit + 1) << (bit + 1)
+        mid = bisect_left(sorted_numbers, prefix | (1 << bit), lo, hi)
+        zero_count, one_count = mid - lo, hi - mid
         logging.debug(
-            f"CO2 Counts: {zero_count}/{one_count} Bitcriteria: {deletion_criteria}, remove {deletion_indices}, remaining {co2_numbers}"
+            f"{'O2' if most_common else 'CO2'} Bit {bit} Counts: {zero_count}/{one_count}, remaining [{lo}, {hi})"
         )
 
-logging.info(f"O2: {numbers[o2_numbers[0]]}")
-logging.info(f"CO2: {numbers[co2_numbers[0]]}")
-logging.info(f"Multiplication: {numbers[o2_numbers[0]] * numbers[co2_numbers[0]]}")
+        if zero_count == 0 or one_count == 0:
+            continue
+
+        keep_ones = one_count >= zero_count if most_common else one_count < zero_count
+        if keep_ones:
+            lo = mid
+        else:
+            hi = mid
+    return sorted_numbers[lo]
+
+
+def main():
+    with open(filename, "rb") as f:
+        one_counts, rows = count_column_bits(read_bit_blocks(f, BLOCK_SIZE))
+        f.seek(0)
+        numbers = [int(line, 2) for line in f if line.strip()]
+    width = len(one_counts)
+
+    logging.debug(f"One counts per column: {one_counts} of {rows}")
+    logging.debug(f"Numbers: {numbers}")
+
+    gammarate, epsilonrate = get_gamma_epsilon(one_counts, rows)
+    logging.info(f"Gammarate: {gammarate}")
+    logging.info(f"Epsilonrate: {epsilonrate}")
+    logging.info(f"Multipilcation: {gammarate * epsilonrate}")
+
+    sorted_numbers = sorted(numbers)
+    o2_rating = get_rating(sorted_numbers, width, most_common=True)
+    co2_rating = get_rating(sorted_numbers, width, most_common=False)
+    logging.info(f"O2: {o2_rating}")
+    logging.info(f"CO2: {co2_rating}")
+    logging.info(f"Multiplication: {o2_rating * co2_rating}")
+
+
+main()
@@ -1,7 +1,9 @@
-from typing import List, Tuple
-import sys, os
+from typing import Dict, List, Tuple
+import sys, os, numpy, random
 import logging
 from enum import Enum
+from collections import Counter
+from multiprocessing import Pool
 
 logging.basicConfig(format="%(message)s", level=logging.INFO)
 
@@ -10,6 +12,8 @@ filename = (
     if len(sys.argv) > 1
     else os.path.join(os.path.dirname(os.path.abspath(__file__)), "testinput")
 )
+mode = sys.argv[2] if len(sys.argv) > 2 else "simulate"
+MONTECARLO_DRAW_ORDERS = 1000
 
 
 class Direction(Enum):
@@ -20,6 +24,10 @@ class Direction(Enum):
 class BingoBoard:
     board: List[List[int]]
     markers: List[List[bool]]
+    row_hits: List[int]
+    column_hits: List[int]
+    unmarked_sum: int
+    has_won: bool
     xsize: int
     ysize: int
 
@@ -34,6 +42,10 @@ class BingoBoard:
             self.markers.append(marker)
         self.xsize = len(self.board[0])
         self.ysize = len(self.board)
+        self.row_hits = [0] * self.ysize
+        self.column_hits = [0] * self.xsize
+        self.unmarked_sum = sum(sum(row) for row in self.board)
+        self.has_won = False
 
     def __str__(self) -> str:
         text = ""
@@ -44,107 +56,204 @@ class BingoBoard:
             text = f"{text}\n"
         return text
 
-    def mark_number(self, number: int):
-        for ri, row in enumerate(self.board):
-            for ci, column in enumerate(row):
-                if column == number:
-                    self.markers[ri][ci] = True
+    def mark_cell(self, ri: int, ci: int) -> bool:
+        # returns True if this mark completed a row or column
+        if self.markers[ri][ci]:
+            return False
+        self.markers[ri][ci] = True
+        self.unmarked_sum -= self.board[ri][ci]
+        self.row_hits[ri] += 1
+        self.column_hits[ci] += 1
+        return self.row_hits[ri] == self.xsize or self.column_hits[ci] == self.ysize
 
     def get_winnings(self) -> List[Tuple[Direction, int]]:
-        row_winnings = [(Direction.ROW, x) for x in self.get_row_winnings()]
-        column_winnings = [(Direction.COLUMN, x) for x in self.get_column_winnings()]
+        row_winnings = [
+            (Direction.ROW, ri)
+            for ri, hits in enumerate(self.row_hits)
+            if hits == self.xsize
+        ]
+        column_winnings = [
+            (Direction.COLUMN, ci)
+            for ci, hits in enumerate(self.column_hits)
+            if hits == self.ysize
+        ]
         row_winnings.extend(column_winnings)
         return row_winnings
 
-    def get_row_winnings(self) -> List[int]:
-        winning_rows = []
-        for ri in range(self.ysize):
-            is_full = True
-            for ci in range(self.xsize):
-                if not self.markers[ri][ci]:
-                    is_full = False
-                    break
-
-            if is_full:
-                winning_rows.append(ri)
-        return winning_rows
-
-    def get_column_winnings(self) -> List[int]:
-        winning_cols = []
-        for ci in range(self.xsize):
-            is_full = True
-            for ri in range(self.ysize):
-                if not self.markers[ri][ci]:
-                    is_full = False
-                    break
-
-            if is_full:
-                winning_cols.append(ri)
-        return winning_cols
-
     def get_score(self, last_number: int) -> int:
-        score = 0
-        for ri in range(self.ysize):
-            for ci in range(self.xsize):
-                if not self.markers[ri][ci]:
-                    score += self.board[ri][ci]
-        return score * last_number
+        return self.unmarked_sum * last_number
+
+
+class BingoGame:
+    boards: List[BingoBoard]
+    cell_index: Dict[int, List[Tuple[int, int, int]]]
+    boards_left: int
+
+    def __init__(self, boards: List[BingoBoard]) -> None:
+        self.boards = boards
+        self.boards_left = len(boards)
+        # number -> all cells holding it as (board index, row, column)
+        self.cell_index = {}
+        for bi, board in enumerate(boards):
+            for ri, row in enumerate(board.board):
+                for ci, number in enumerate(row):
+                    self.cell_index.setdefault(number, []).append((bi, ri, ci))
+
+    def draw(self, number: int) -> List[int]:
+        # returns the indices of all boards which won for the first time with this number
+        winners = []
+        for bi, ri, ci in self.cell_index.get(number, []):
+            board = self.boards[bi]
+            if board.mark_cell(ri, ci) and not board.has_won:
+                board.has_won = True
+                self.boards_left -= 1
+                winners.append(bi)
+        return winners
+
+
+def stack_boards(boards: List[BingoBoard]) -> numpy.ndarray:
+    return numpy.array([board.board for board in boards], dtype=numpy.int64)
+
+
+def get_draw_turns(numbers: List[int], highest_number: int) -> numpy.ndarray:
+    # number -> index of the draw it gets marked in, len(numbers) if it is never drawn
+    draw_turns = numpy.full(highest_number + 1, len(numbers), dtype=numpy.int64)
+    for turn, number in reversed(list(enumerate(numbers))):
+        draw_turns[number] = turn
+    return draw_turns
+
+
+def rank_boards(
+    board_array: numpy.ndarray, numbers: List[int]
+) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    # A row or column is complete once its last cell is drawn, and the board wins with
+    # its first complete row or column. Boards that never win get turn len(numbers)
+    # and score 0. Returns the board indices ordered by win turn, win turns and scores.
+    highest_number = max(int(board_array.max()), max(numbers))
+    turns = get_draw_turns(numbers, highest_number)[board_array]
+    win_turns = numpy.minimum(
+        turns.max(axis=2).min(axis=1), turns.max(axis=1).min(axis=1)
+    )
+
+    unmarked = numpy.where(turns > win_turns[:, None, None], board_array, 0)
+    last_numbers = numpy.append(numpy.array(numbers, dtype=numpy.int64), 0)[win_turns]
+    scores = unmarked.sum(axis=(1, 2)) * last_numbers
+    return numpy.argsort(win_turns, kind="stable"), win_turns, scores
+
+
+def main_vectorized(numbers: List[int], boards: List[BingoBoard]):
+    ranking, win_turns, scores = rank_boards(stack_boards(boards), numbers)
+    ranking = ranking[win_turns[ranking] < len(numbers)]
+    logging.debug(f"Ranking: {ranking.tolist()}")
+    logging.debug(f"Win turns: {win_turns[ranking].tolist()}")
+
+    if len(ranking) == 0:
+        logging.info("No board wins")
+        return
+    for name, index in [("WINNING", ranking[0]), ("LOSING", ranking[-1])]:
+        logging.info(f"{name} Board #{index} at turn {win_turns[index]}")
+        logging.info(f"WIN score: {scores[index]}\n\n")
+
+
+worker_board_array = None
+
+
+def init_worker(board_array: numpy.ndarray):
+    # every worker gets the parsed boards once instead of once per draw order
+    global worker_board_array
+    worker_board_array = board_array
+
+
+def evaluate_draw_order(numbers: List[int]) -> Tuple[int, int, int, int]:
+    # (first winner, its score, last winner, its score), -1 as winner if nobody wins
+    ranking, win_turns, scores = rank_boards(worker_board_array, numbers)
+    ranking = ranking[win_turns[ranking] < len(numbers)]
+    if len(ranking) == 0:
+        return (-1, 0, -1, 0)
+    first, last = ranking[0], ranking[-1]
+    return (int(first), int(scores[first]), int(last), int(scores[last]))
+
+
+def evaluate_draw_orders(
+    board_array: numpy.ndarray, draw_orders: List[List[int]], processes: int = None
+) -> numpy.ndarray:
+    with Pool(processes, initializer=init_worker, initargs=(board_array,)) as pool:
+        results = pool.map(
+            evaluate_draw_order, draw_orders, chunksize=max(1, len(draw_orders) // 64)
+        )
+    return numpy.array(results, dtype=numpy.int64).reshape(-1, 4)
+
+
+def main_montecarlo(numbers: List[int], boards: List[BingoBoard]):
+    rng = random.Random(0)
+    draw_orders = [
+        rng.sample(numbers, len(numbers)) for _ in range(MONTECARLO_DRAW_ORDERS)
+    ]
+    results = evaluate_draw_orders(stack_boards(boards), draw_orders)
+
+    first_winners = Counter(results[:, 0].tolist())
+    last_winners = Counter(results[:, 2].tolist())
+    logging.info(f"Most frequent first winners: {first_winners.most_common(3)}")
+    logging.info(f"Most frequent last winners: {last_winners.most_common(3)}")
+    logging.info(f"Mean first score: {results[:, 1].mean():.1f}")
+    logging.info(f"Mean last score: {results[:, 3].mean():.1f}")
 
 
 def main():
     numbers = []
     boards = []
-    boards_won = []
     with open(filename, "r") as f:
         numbers, boards = parse_input([x.strip() for x in f.readlines()])
-        boards_won = list(range(len(boards)))
+
+    if mode == "vectorized":
+        main_vectorized(numbers, boards)
+        return
+    elif mode == "montecarlo":
+        main_montecarlo(numbers, boards)
+        return
+
+    game = BingoGame(boards)
 
     logging.debug(f"Numbers: {numbers}")
     for board in boards:
         logging.debug(f"Board: \n{str(board)}")
 
+    first_winner_found = False
     for number in numbers:
-        for index, board in enumerate(boards):
-            board.mark_number(number)
+        winners = game.draw(number)
+        for index in winners:
+            board = boards[index]
             win = board.get_winnings()
-            if len(win) > 0:
 
-                # first winning board
-                if len(boards) == len(boards_won):
-                    logging.info(f"WINNING Board: \n{str(board)}")
-                    logging.info(f"WIN by: {str(win)}")
-                    logging.info(f"WIN score: {board.get_score(number)}\n\n")
+            # first winning board
+            if not first_winner_found:
+                first_winner_found = True
+                logging.info(f"WINNING Board: \n{str(board)}")
+                logging.info(f"WIN by: {str(win)}")
+                logging.info(f"WIN score: {board.get_score(number)}\n\n")
 
-                # last winning board
-                if len(boards_won) == 1 and index in boards_won:
-                    logging.info(f"LOSING Board: \n{str(board)}")
-                    logging.info(f"WIN by: {str(win)}")
-                    logging.info(f"WIN score: {board.get_score(number)}\n\n")
-                    return
-
-                try:
-                    boards_won.remove(index)
-                except:
-                    pass
+            # last winning board
+            if game.boards_left == 0 and index == winners[-1]:
+                logging.info(f"LOSING Board: \n{str(board)}")
+                logging.info(f"WIN by: {str(win)}")
+                logging.info(f"WIN score: {board.get_score(number)}\n\n")
+                return
 
 
 def parse_input(input: List[str]) -> Tuple[List[int], List[BingoBoard]]:
-    numbers = [int(x) for x in input.pop(0).split(",")]
+    numbers = [int(x) for x in input[0].split(",")]
     boards = []
 
-    input.pop(0)  # remove blank line before first board
-    if input[-1] != "":
-        input.append("")  # append blank line for board detection
-
     board_input = []
-    while len(input) > 0:
-        board_input.append(input.pop(0))
-        if input[0] == "":
-            input.pop(0)
+    for line in input[1:] + [""]:  # blank line at the end for board detection
+        if line != "":
+            board_input.append(line)
+        elif len(board_input) > 0:
             boards.append(BingoBoard(board_input))
             board_input = []
 
     return (numbers, boards)
 
 
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,10 @@
 from __future__ import annotations
-from typing import List, Tuple
-import sys, os, re
+from typing import Dict, List, Optional, Tuple
+import sys, os, re, numpy
+from bisect import bisect_left, bisect_right, insort
 import logging
 from enum import Enum
+from multiprocessing import Pool
 
 logging.basicConfig(format="%(message)s", level=logging.INFO)
 LINE_REGEX = re.compile("(\d+),(\d+) -> (\d+),(\d+)")
@@ -13,6 +15,28 @@ filename = (
     if len(sys.argv) > 1
     else os.path.join(os.path.dirname(os.path.abspath(__file__)), "testinput")
 )
+mode = sys.argv[2] if len(sys.argv) > 2 else "dense"
+TILE_SIZE = 4096
+# segments drawn into a uint8 tile before clamping it to 2, so 2 + batch fits into 255
+SEGMENT_BATCH = 253
+
+
+class LineFamily(Enum):
+    # every segment lies on a line x = key, y = key, x - y = key or x + y = key
+    # and is an interval of the parameter t along that line
+    HORIZONTAL = 0  # key y, t = x
+    VERTICAL = 1  # key x, t = y
+    DIAGONAL = 2  # key x - y, t = x
+    ANTIDIAGONAL = 3  # key x + y, t = x
+
+
+# (a, b) of the line equation a * x + b * y = key
+LINE_FAMILY_COEFFICIENTS = {
+    LineFamily.HORIZONTAL: (0, 1),
+    LineFamily.VERTICAL: (1, 0),
+    LineFamily.DIAGONAL: (1, -1),
+    LineFamily.ANTIDIAGONAL: (1, 1),
+}
 
 
 class Line:
@@ -43,6 +67,12 @@ class Line:
             self.endposition[1],
         )
 
+    def get_delta(self) -> Tuple[int, int]:
+        return (
+            self.endposition[0] - self.startposition[0],
+            self.endposition[1] - self.startposition[1],
+        )
+
     def get_direction(self) -> Tuple[int, int]:
         return (
             sign(self.endposition[0] - self.startposition[0]),
@@ -58,6 +88,16 @@ class Line:
     def is_diagonal(self) -> bool:
         return not self.is_horizontal() and not self.is_vertical()
 
+    def get_family_interval(self) -> Tuple[LineFamily, int, int, int]:
+        (x1, y1), (x2, y2) = self.startposition, self.endposition
+        if self.is_horizontal():
+            return LineFamily.HORIZONTAL, y1, min(x1, x2), max(x1, x2)
+        elif self.is_vertical():
+            return LineFamily.VERTICAL, x1, min(y1, y2), max(y1, y2)
+        elif self.get_direction()[0] == self.get_direction()[1]:
+            return LineFamily.DIAGONAL, x1 - y1, min(x1, x2), max(x1, x2)
+        return LineFamily.ANTIDIAGONAL, x1 + y1, min(x1, x2), max(x1, x2)
+
 
 class Board:
     board: List[List[int]]
@@ -89,7 +129,6 @@ class Board:
         x = line.startposition[0]
         y = line.startposition[1]
         while x != line.endposition[0] or y != line.endposition[1]:
-            logging.debug(f"drawing {x},{y}")
             self.board[x][y] += 1
             x += direction[0]
             y += direction[1]
@@ -112,21 +151,322 @@ class Board:
         return text
 
 
+class SparseBoard:
+    # Finds the overlaps without a grid, so memory only depends on the number of lines.
+    # Segments on the same line are merged into covered and doubly covered intervals.
+    # A point overlaps if it is doubly covered on one line or where covered intervals
+    # of two different lines cross. Lines of one family never cross each other.
+    covered: Dict[LineFamily, Dict[int, List[Tuple[int, int]]]]
+    doubly_covered: Dict[LineFamily, Dict[int, List[Tuple[int, int]]]]
+
+    def __init__(self, input_lines: List[Line], diagonal_allowed: bool) -> None:
+        intervals = {family: {} for family in LineFamily}
+        for line in input_lines:
+            if diagonal_allowed or not line.is_diagonal():
+                family, key, start, end = line.get_family_interval()
+                intervals[family].setdefault(key, []).append((start, end))
+
+        self.covered = {family: {} for family in LineFamily}
+        self.doubly_covered = {family: {} for family in LineFamily}
+        for family, lines_by_key in intervals.items():
+            for key, line_intervals in lines_by_key.items():
+                covered, doubly_covered = self.sweep_intervals(line_intervals)
+                self.covered[family][key] = covered
+                if len(doubly_covered) > 0:
+                    self.doubly_covered[family][key] = doubly_covered
+
+    @staticmethod
+    def sweep_intervals(
+        intervals: List[Tuple[int, int]],
+    ) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]:
+        # sorted, disjoint and inclusive intervals covered at least once and at least twice
+        events = sorted(
+            [(start, 1) for start, _ in intervals]
+            + [(end + 1, -1) for _, end in intervals]
+        )
+        covered, doubly_covered = [], []
+        count = 0
+        for t, change in events:
+            for minimum_count, result in [(1, covered), (2, doubly_covered)]:
+                if count < minimum_count <= count + change:
+                    if len(result) > 0 and result[-1][1] == t - 1:
+                        result[-1] = (result[-1][0], None)
+                    else:
+                        result.append((t, None))
+                elif count + change < minimum_count <= count:
+                    result[-1] = (result[-1][0], t - 1)
+            count += change
+        return covered, doubly_covered
+
+    @staticmethod
+    def get_parameter(family: LineFamily, position: Tuple[int, int]) -> int:
+        return position[1] if family == LineFamily.VERTICAL else position[0]
+
+    @staticmethod
+    def get_position(family: LineFamily, key: int, t: int) -> Tuple[int, int]:
+        if family == LineFamily.HORIZONTAL:
+            return t, key
+        elif family == LineFamily.VERTICAL:
+            return key, t
+        elif family == LineFamily.DIAGONAL:
+            return t, t - key
+        return t, key - t
+
+    @staticmethod
+    def get_key(family: LineFamily, position: Tuple[int, int]) -> int:
+        a, b = LINE_FAMILY_COEFFICIENTS[family]
+        return a * position[0] + b * position[1]
+
+    @staticmethod
+    def get_crossing(
+        family_a: LineFamily, key_a: int, family_b: LineFamily, key_b: int
+    ) -> Optional[Tuple[int, int]]:
+        # solve both line equations, None if they cross between grid points
+        a1, a2 = LINE_FAMILY_COEFFICIENTS[family_a]
+        b1, b2 = LINE_FAMILY_COEFFICIENTS[family_b]
+        determinant = a1 * b2 - a2 * b1
+        x, x_rest = divmod(key_a * b2 - a2 * key_b, determinant)
+        y, y_rest = divmod(a1 * key_b - key_a * b1, determinant)
+        if x_rest != 0 or y_rest != 0:
+            return None
+        return x, y
+
+    @staticmethod
+    def contains(intervals: List[Tuple[int, int]], t: int) -> bool:
+        index = bisect_right(intervals, (t, float("inf"))) - 1
+        return index >= 0 and intervals[index][0] <= t <= intervals[index][1]
+
+    def count_doubly_covering_lines(self, position: Tuple[int, int]) -> int:
+        count = 0
+        for family in LineFamily:
+            intervals = self.doubly_covered[family].get(self.get_key(family, position))
+            if intervals and self.contains(
+                intervals, self.get_parameter(family, position)
+            ):
+                count += 1
+        return count
+
+    def get_key_range(
+        self, family: LineFamily, key: int, start: int, end: int, other: LineFamily
+    ) -> Tuple[int, int]:
+        # keys of the other family at both ends of an interval, the key changes
+        # monotonically in between
+        return tuple(
+            sorted(
+                self.get_key(other, self.get_position(family, key, t))
+                for t in (start, end)
+            )
+        )
+
+    def find_crossings(
+        self, family_a: LineFamily, family_b: LineFamily
+    ) -> List[Tuple[int, int]]:
+        # With the keys of both families as coordinates (u, v) every interval of family a
+        # is a vertical segment and every interval of family b a horizontal one. Sweep
+        # over u, keep the v of the horizontal segments at the sweep position sorted and
+        # report the ones inside each vertical segment. The work stays close to the
+        # number of crossings instead of the number of line pairs.
+        INSERT, QUERY, REMOVE = 0, 1, 2
+        events = []
+        for key_b, intervals in self.covered[family_b].items():
+            for start, end in intervals:
+                u_lo, u_hi = self.get_key_range(family_b, key_b, start, end, family_a)
+                events.append((u_lo, INSERT, key_b, key_b))
+                events.append((u_hi, REMOVE, key_b, key_b))
+        for key_a, intervals in self.covered[family_a].items():
+            for start, end in intervals:
+                events.append(
+                    (
+                        key_a,
+                        QUERY,
+                        *self.get_key_range(family_a, key_a, start, end, family_b),
+                    )
+                )
+        events.sort()
+
+        # covered intervals on one line are disjoint, so every v is active at most once
+        active = []
+        crossings = []
+        for u, kind, v, v_hi in events:
+            if kind == INSERT:
+                insort(active, v)
+            elif kind == REMOVE:
+                del active[bisect_left(active, v)]
+            else:
+                for key_b in active[
+                    bisect_left(active, v) : bisect_right(active, v_hi)
+                ]:
+                    # real crossings between grid points are no overlap
+                    position = self.get_crossing(family_a, u, family_b, key_b)
+                    if position is not None:
+                        crossings.append(position)
+        return crossings
+
+    def get_amount_of_overlap_points(self) -> int:
+        overlaps = sum(
+            end - start + 1
+            for lines_by_key in self.doubly_covered.values()
+            for intervals in lines_by_key.values()
+            for start, end in intervals
+        )
+
+        crossings = set()
+        families = list(LineFamily)
+        for index, family_a in enumerate(families):
+            for family_b in families[index + 1 :]:
+                crossings.update(self.find_crossings(family_a, family_b))
+
+        # crossings which are not doubly covered yet are new overlaps, crossings doubly
+        # covered on several lines were counted once per line above
+        for position in crossings:
+            doubly_covering_lines = self.count_doubly_covering_lines(position)
+            overlaps += 1 if doubly_covering_lines == 0 else 1 - doubly_covering_lines
+        return overlaps
+
+
+def get_segment_array(lines: List[Line], diagonal_allowed: bool) -> numpy.ndarray:
+    # one row x, y, dx, dy, length per drawn segment
+    return numpy.array(
+        [
+            [
+                *line.startposition,
+                *line.get_direction(),
+                max(map(abs, line.get_delta())),
+            ]
+            for line in lines
+            if diagonal_allowed or not line.is_diagonal()
+        ],
+        dtype=numpy.int64,
+    ).reshape(-1, 5)
+
+
+def clip_segments(
+    segments: numpy.ndarray, x0: int, y0: int, tile_size: int
+) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    # range [t_lo, t_hi] of the steps along each segment which lie inside the tile
+    t_lo = numpy.zeros(len(segments), dtype=numpy.int64)
+    t_hi = segments[:, 4].copy()
+    for axis, origin in [(0, x0), (1, y0)]:
+        start, direction = segments[:, axis], segments[:, axis + 2]
+        first = (origin - start) * direction
+        last = (origin + tile_size - 1 - start) * direction
+        inside = (origin <= start) & (start < origin + tile_size)
+        t_lo = numpy.maximum(
+            t_lo,
+            numpy.where(
+                direction == 0, numpy.where(inside, 0, 1), numpy.minimum(first, last)
+            ),
+        )
+        t_hi = numpy.minimum(
+            t_hi,
+            numpy.where(
+                direction == 0, numpy.where(inside, t_hi, 0), numpy.maximum(first, last)
+            ),
+        )
+    return t_lo, t_hi
+
+
+worker_segments = None
+worker_bounds = None
+
+
+def init_worker(segments: numpy.ndarray):
+    # every worker gets the segments once and picks the ones for its tiles by itself
+    global worker_segments, worker_bounds
+    ends = segments[:, :2] + segments[:, 2:4] * segments[:, 4:5]
+    worker_segments = segments
+    worker_bounds = numpy.minimum(segments[:, :2], ends), numpy.maximum(
+        segments[:, :2], ends
+    )
+
+
+def count_tile_overlaps(args: Tuple[int, int, int]) -> int:
+    x0, y0, tile_size = args
+    # the bounding boxes are a cheap first filter, the clipping drops the segments
+    # which only pass by a corner of the tile
+    lower, upper = worker_bounds
+    segments = worker_segments[
+        (lower[:, 0] < x0 + tile_size)
+        & (upper[:, 0] >= x0)
+        & (lower[:, 1] < y0 + tile_size)
+        & (upper[:, 1] >= y0)
+    ]
+    t_lo, t_hi = clip_segments(segments, x0, y0, tile_size)
+    visible = t_hi >= t_lo
+    if numpy.count_nonzero(visible) < 2:
+        return 0
+    segments, t_lo, cell_counts = (
+        segments[visible],
+        t_lo[visible],
+        (t_hi - t_lo + 1)[visible],
+    )
+
+    tile = numpy.zeros(tile_size * tile_size, dtype=numpy.uint8)
+    for batch in range(0, len(segments), SEGMENT_BATCH):
+        batch_segments = segments[batch : batch + SEGMENT_BATCH]
+        batch_counts = cell_counts[batch : batch + SEGMENT_BATCH]
+        # step index along its segment for every cell of the batch
+        steps = numpy.arange(batch_counts.sum()) - numpy.repeat(
+            numpy.cumsum(batch_counts) - batch_counts, batch_counts
+        )
+        steps += numpy.repeat(t_lo[batch : batch + SEGMENT_BATCH], batch_counts)
+        x = numpy.repeat(batch_segments[:, 0], batch_counts) + steps * numpy.repeat(
+            batch_segments[:, 2], batch_counts
+        )
+        y = numpy.repeat(batch_segments[:, 1], batch_counts) + steps * numpy.repeat(
+            batch_segments[:, 3], batch_counts
+        )
+        numpy.add.at(tile, (y - y0) * tile_size + (x - x0), 1)
+        numpy.minimum(tile, 2, out=tile)
+    return int(numpy.count_nonzero(tile > 1))
+
+
+def count_overlaps_tiled(
+    lines: List[Line],
+    diagonal_allowed: bool,
+    tile_size: int = TILE_SIZE,
+    processes: int = None,
+) -> int:
+    segments = get_segment_array(lines, diagonal_allowed)
+    if len(segments) == 0:
+        return 0
+    ends = segments[:, :2] + segments[:, 2:4] * segments[:, 4:5]
+    highest_coordinate = int(numpy.maximum(segments[:, :2], ends).max())
+
+    # only the tile origins are sent, so the parent never holds per tile copies
+    tiles = (
+        (x0, y0, tile_size)
+        for x0 in range(0, highest_coordinate + 1, tile_size)
+        for y0 in range(0, highest_coordinate + 1, tile_size)
+    )
+    with Pool(processes, initializer=init_worker, initargs=(segments,)) as pool:
+        return sum(pool.imap_unordered(count_tile_overlaps, tiles))
+
+
+def get_amount_of_overlap_points(lines: List[Line], diagonal_allowed: bool) -> int:
+    if mode == "sparse":
+        return SparseBoard(lines, diagonal_allowed).get_amount_of_overlap_points()
+    elif mode == "tiled":
+        return count_overlaps_tiled(lines, diagonal_allowed)
+
+    board = Board(lines, diagonal_allowed)
+    logging.debug("%s", board)
+    return board.get_amount_of_overlap_points()
+
+
 def main():
     with open(filename, "r") as f:
         lines = []
         for input in [x.strip() for x in f.readlines()]:
             lines.append(Line.from_string(input))
 
-        board = Board(lines, diagonal_allowed=False)
-        logging.debug("%s", board)
         logging.info(
-            f"Overlaps without diagonals: {board.get_amount_of_overlap_points()}"
+            f"Overlaps without diagonals: {get_amount_of_overlap_points(lines, False)}"
+        )
+        logging.info(
+            f"Overlaps with diagonals: {get_amount_of_overlap_points(lines, True)}"
         )
-
-        board = Board(lines, diagonal_allowed=True)
-        logging.debug("%s", board)
-        logging.info(f"Overlaps with diagonals: {board.get_amount_of_overlap_points()}")
 
 
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 from __future__ import annotations
-import sys, os
+import sys, os, numpy
 import logging
+from typing import List, Optional
 
 logging.basicConfig(format="%(message)s", level=logging.INFO)
 
@@ -9,11 +10,168 @@ filename = (
     if len(sys.argv) > 1
     else os.path.join(os.path.dirname(os.path.abspath(__file__)), "testinput")
 )
+# optional comma separated days to fast forward to with the transition matrix
+target_days = [int(x) for x in sys.argv[2].split(",")] if len(sys.argv) > 2 else []
+modulus = int(sys.argv[3]) if len(sys.argv) > 3 else None
+BREEDING_INTERVAL = 7
+MATURATION_DELAY = 2
+
+INT64_LIMIT = 2**63 - 1
+
+Matrix = List[List[int]]
+
+
+def get_transition_matrix(
+    breeding_interval: int = BREEDING_INTERVAL,
+    maturation_delay: int = MATURATION_DELAY,
+) -> Matrix:
+    # state is the number of fishs per days left until birth (0 .. interval + delay - 1)
+    size = breeding_interval + maturation_delay
+    matrix = [[0] * size for _ in range(size)]
+    for days_left in range(1, size):
+        matrix[days_left - 1][days_left] = 1
+    # fishs giving birth restart their interval, their children need the delay on top
+    matrix[breeding_interval - 1][0] += 1
+    matrix[size - 1][0] += 1
+    return matrix
+
+
+def matrix_multiply(a: Matrix, b: Matrix, modulus: Optional[int] = None) -> Matrix:
+    result = [
+        [sum(x * y for x, y in zip(row, column)) for column in zip(*b)] for row in a
+    ]
+    if modulus is not None:
+        result = [[x % modulus for x in row] for row in result]
+    return result
+
+
+def matrix_power(
+    matrix: Matrix, exponent: int, modulus: Optional[int] = None
+) -> Matrix:
+    # exponentiation by squaring, so only O(log exponent) multiplications
+    result = [[int(x == y) for y in range(len(matrix))] for x in range(len(matrix))]
+    while exponent > 0:
+        if exponent & 1:
+            result = matrix_multiply(result, matrix, modulus)
+        matrix = matrix_multiply(matrix, matrix, modulus)
+        exponent >>= 1
+    return result
+
+
+def count_fish_after(
+    numbers: List[int],
+    days: int,
+    breeding_interval: int = BREEDING_INTERVAL,
+    maturation_delay: int = MATURATION_DELAY,
+    modulus: Optional[int] = None,
+) -> int:
+    matrix = get_transition_matrix(breeding_interval, maturation_delay)
+    state = [
+        [x] for x in get_population_state(numbers, breeding_interval, maturation_delay)
+    ]
+
+    final_state = matrix_multiply(matrix_power(matrix, days, modulus), state, modulus)
+    total = sum(row[0] for row in final_state)
+    return total if modulus is None else total % modulus
+
+
+def get_population_state(
+    numbers: List[int],
+    breeding_interval: int = BREEDING_INTERVAL,
+    maturation_delay: int = MATURATION_DELAY,
+) -> List[int]:
+    state = [0] * (breeding_interval + maturation_delay)
+    for number in numbers:
+        state[number] += 1
+    return state
+
+
+def fits_int64(states: numpy.ndarray, factor: int) -> bool:
+    # a row of buckets weighted by at most factor sums to at most
+    # factor * buckets * largest bucket, which needs no sum to check
+    largest_bucket = int(states.max(initial=0)) if states.dtype != object else None
+    return (
+        largest_bucket is not None
+        and factor <= INT64_LIMIT
+        and factor * states.shape[-1] * largest_bucket <= INT64_LIMIT
+    )
+
+
+def advance_states(
+    states: numpy.ndarray, step: Matrix, modulus: Optional[int] = None
+) -> numpy.ndarray:
+    # stay with int64 while the products fit and switch to exact python ints afterwards
+    if fits_int64(states, max(max(row) for row in step)):
+        states = states @ numpy.array(step, dtype=numpy.int64).T
+    else:
+        states = states.astype(object) @ numpy.array(step, dtype=object).T
+    return states if modulus is None else states % modulus
+
+
+def count_fish_batch(
+    states: numpy.ndarray,
+    horizons: List[int],
+    breeding_interval: int = BREEDING_INTERVAL,
+    maturation_delay: int = MATURATION_DELAY,
+    modulus: Optional[int] = None,
+) -> numpy.ndarray:
+    # populations as rows of bucket counts, returns the population per row and horizon
+    if any(a > b for a, b in zip(horizons, horizons[1:])):
+        raise Exception("horizons have to be sorted")
+
+    matrix = get_transition_matrix(breeding_interval, maturation_delay)
+    states = numpy.asarray(states, dtype=numpy.int64).reshape(-1, len(matrix))
+    totals = []
+    current_day = 0
+    for horizon in horizons:
+        step = matrix_power(matrix, horizon - current_day, modulus)
+        states = advance_states(states, step, modulus)
+        total = (
+            states.sum(axis=1)
+            if fits_int64(states, 1)
+            else states.astype(object).sum(axis=1)
+        )
+        totals.append(total if modulus is None else total % modulus)
+        current_day = horizon
+
+    if len(totals) == 0:
+        return numpy.zeros((len(states), 0), dtype=numpy.int64)
+    if all(total.dtype != object for total in totals):
+        return numpy.stack(totals, axis=1)
+    results = numpy.stack([total.astype(object) for total in totals], axis=1)
+    if all(x <= INT64_LIMIT for x in results.flat):
+        return results.astype(numpy.int64)
+    return results
 
 
 def main():
+    if len(target_days) > 0:
+        # every input line is one population
+        with open(filename, "r") as f:
+            populations = [
+                [int(x) for x in line.strip().split(",")] for line in f if line.strip()
+            ]
+        if len(populations) == 1:
+            for days in target_days:
+                logging.info(
+                    f"Growth after {days:03d} days: {count_fish_after(populations[0], days, modulus=modulus):04d}"
+                )
+            return
+
+        # the batch needs sorted horizons, the results are reported in the given order
+        horizons = sorted(set(target_days))
+        states = [get_population_state(numbers) for numbers in populations]
+        results = count_fish_batch(numpy.array(states), horizons, modulus=modulus)
+        for index, row in enumerate(results):
+            for days in target_days:
+                logging.info(
+                    f"Population {index} growth after {days:03d} days: {row[horizons.index(days)]:04d}"
+                )
+        return
+
     with open(filename, "r") as f:
         numbers = [int(x) for x in f.readline().strip().split(",")]
+
         # number of active breeding fishs per day of breeding interval (fishs that give birth after 7 days)
         fish_breeding = [0 for _ in range(7)]
         # number of fishs that have the initial growing delay (they get added to fish_breeding after 2 days)
@@ -43,4 +201,4 @@ def main():
                 )
 
 
-main()
\ No newline at end of file
+main()
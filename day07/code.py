@@ -1,7 +1,9 @@
 from __future__ import annotations
-import sys, os
+import sys, os, numpy
 import logging
-import statistics, math
+import statistics, math, itertools
+from bisect import bisect_right
+from typing import Callable, List, Tuple
 
 logging.basicConfig(format="%(message)s", level=logging.INFO)
 
@@ -10,12 +12,140 @@ filename = (
     if len(sys.argv) > 1
     else os.path.join(os.path.dirname(os.path.abspath(__file__)), "testinput")
 )
+mode = sys.argv[2] if len(sys.argv) > 2 else "gradient"
+curve_filename = sys.argv[3] if len(sys.argv) > 3 else None
+INT64_LIMIT = 2**63 - 1
+# fuel per distance d as polynomial coefficients [a0, a1, ...] and a common divisor
+LINEAR_COST = ([0, 1], 1)
+TRIANGULAR_COST = ([0, 1, 1], 2)
+
+
+def get_cost_curve(
+    positions: List[int], coefficients: List[int], divisor: int = 1
+) -> Tuple[int, numpy.ndarray]:
+    # Total fuel for every target between the lowest and highest crab. For crabs left of
+    # the target the binomial expansion of (p - x)^k only needs the prefix sums of x^j
+    # over the histogram, crabs right of the target use the remaining suffix sums.
+    lowest = min(positions)
+    histogram = numpy.bincount(numpy.array(positions) - lowest)
+    degree = len(coefficients) - 1
+    size = len(histogram)
+
+    # exact python ints as soon as int64 could overflow
+    bound = (
+        len(positions) * size**degree * sum(abs(x) for x in coefficients) * 2**degree
+    )
+    dtype = numpy.int64 if bound <= INT64_LIMIT else object
+    targets = numpy.arange(size).astype(dtype)
+    histogram = histogram.astype(dtype)
+
+    prefix_sums = [numpy.cumsum(histogram * targets**j) for j in range(degree + 1)]
+    totals = [prefix_sum[-1] for prefix_sum in prefix_sums]
+    costs = numpy.zeros(size, dtype=dtype)
+    for k, coefficient in enumerate(coefficients):
+        if coefficient == 0:
+            continue
+        for j in range(k + 1):
+            binomial = math.comb(k, j)
+            left = targets ** (k - j) * prefix_sums[j] * (-1) ** j
+            right = (-targets) ** (k - j) * (totals[j] - prefix_sums[j])
+            costs += coefficient * binomial * (left + right)
+    return lowest, costs // divisor
+
+
+def find_cheapest_position(
+    positions: List[int], coefficients: List[int], divisor: int = 1
+) -> Tuple[int, int]:
+    lowest, costs = get_cost_curve(positions, coefficients, divisor)
+    index = int(numpy.argmin(costs))
+    return lowest + index, int(costs[index])
+
+
+def export_cost_curve(
+    filename: str, positions: List[int], cost_functions: List[Tuple[List[int], int]]
+):
+    curves = [
+        get_cost_curve(positions, *cost_function) for cost_function in cost_functions
+    ]
+    with open(filename, "w") as f:
+        for index in range(len(curves[0][1])):
+            costs = ",".join(str(costs[index]) for _, costs in curves)
+            f.write(f"{curves[0][0] + index},{costs}\n")
+
+
+class SortedCrabs:
+    # Sorted positions with prefix sums of x and x^2, so the total fuel for any target
+    # is a bisection plus a few arithmetic operations, independent of the position range.
+    positions: List[int]
+    prefix_sums: List[int]
+    prefix_square_sums: List[int]
+
+    def __init__(self, positions: List[int]) -> None:
+        self.positions = sorted(positions)
+        self.prefix_sums = [0] + list(itertools.accumulate(self.positions))
+        self.prefix_square_sums = [0] + list(
+            itertools.accumulate(x * x for x in self.positions)
+        )
+
+    def linear_cost(self, target: int) -> int:
+        index = bisect_right(self.positions, target)
+        left_count, right_count = index, len(self.positions) - index
+        left_sum = self.prefix_sums[index]
+        right_sum = self.prefix_sums[-1] - left_sum
+        return left_count * target - left_sum + right_sum - right_count * target
+
+    def triangular_cost(self, target: int) -> int:
+        # d(d+1)/2 summed up, the sum of d^2 does not depend on the side of the target
+        square_distances = (
+            len(self.positions) * target * target
+            - 2 * target * self.prefix_sums[-1]
+            + self.prefix_square_sums[-1]
+        )
+        return (square_distances + self.linear_cost(target)) // 2
+
+    def find_cheapest_position(self, cost: Callable[[int], int]) -> Tuple[int, int]:
+        # both costs are convex, so the cheapest target is where the cost stops falling
+        lo, hi = self.positions[0], self.positions[-1]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if cost(mid) <= cost(mid + 1):
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo, cost(lo)
 
 
 def main():
     with open(filename, "r") as f:
         positions = [int(x) for x in f.readline().strip().split(",")]
 
+        if mode == "convex":
+            crabs = SortedCrabs(positions)
+            for name, cost in [
+                ("linear", crabs.linear_cost),
+                ("triangular", crabs.triangular_cost),
+            ]:
+                position, fuel = crabs.find_cheapest_position(cost)
+                logging.info(
+                    f"Position with lowest fuel requirement with {name} fuel consumption: x={position} fuel_total={fuel}"
+                )
+            return
+
+        if mode == "histogram":
+            for name, cost_function in [
+                ("linear", LINEAR_COST),
+                ("triangular", TRIANGULAR_COST),
+            ]:
+                position, fuel = find_cheapest_position(positions, *cost_function)
+                logging.info(
+                    f"Position with lowest fuel requirement with {name} fuel consumption: x={position} fuel_total={fuel}"
+                )
+            if curve_filename is not None:
+                export_cost_curve(
+                    curve_filename, positions, [LINEAR_COST, TRIANGULAR_COST]
+                )
+            return
+
         # PART 1
         # median should be per definition the position that minimizes the sum of distances
         median = statistics.median_low(positions)
@@ -75,4 +205,4 @@ def main():
         )
 
 
-main()
\ No newline at end of file
+main()
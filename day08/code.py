@@ -1,8 +1,9 @@
 from __future__ import annotations
 import sys, os
 import logging
-import statistics, math
-from typing import Dict, List, Set
+import statistics, math, itertools, functools, numpy
+from multiprocessing import Pool
+from typing import Dict, FrozenSet, List, Optional, Tuple
 
 logging.basicConfig(format="%(message)s", level=logging.INFO)
 
@@ -11,114 +12,342 @@ filename = (
     if len(sys.argv) > 1
     else os.path.join(os.path.dirname(os.path.abspath(__file__)), "testinput")
 )
+mode = sys.argv[2] if len(sys.argv) > 2 else "rules"
+SEGMENTS = "abcdefg"
+DIGIT_SEGMENTS = [
+    "abcefg",
+    "cf",
+    "acdeg",
+    "acdfg",
+    "bcdf",
+    "abdfg",
+    "abdefg",
+    "acf",
+    "abcdefg",
+    "abcdfg",
+]
+POPCOUNT = numpy.array([x.bit_count() for x in range(128)], dtype=numpy.uint8)
+# wire orders tried per line to find the canonical relabeling for the solver cache
+CANONICAL_ORDERS = 720
 
 
-class Decoder:
-    raw_digit_characters: List[Set[str]]
-    raw_output_characters: List[Set[str]]
-    digit_word_map: Dict[int, Set[str]]
+def word_to_mask(word: str) -> int:
+    # segment a is bit 0, ..., segment g is bit 6
+    mask = 0
+    for character in word:
+        mask |= 1 << (ord(character) - ord("a"))
+    return mask
 
-    def __init__(self, line: str) -> None:
-        self.raw_digit_characters = []
-        self.raw_output_characters = []
-        self.digit_word_map = {i: "" for i in range(10)}
 
-        left_side, right_side = (
-            line.split("|")[0].strip(),
-            line.split("|")[1].strip(),
-        )
+def mask_to_word(mask: int) -> str:
+    return "".join(x for i, x in enumerate(SEGMENTS) if mask & (1 << i))
 
-        for word in left_side.split():
-            self.raw_digit_characters.append(set(word))
 
-        for word in right_side.split():
-            self.raw_output_characters.append(set(word))
+def is_subset(mask: int, other: int) -> bool:
+    return mask & other == mask
+
+
+class Decoder:
+    __slots__ = ("digit_masks", "output_masks", "digit_word_map")
+    # one byte per pattern mask
+    digit_masks: bytes
+    output_masks: bytes
+    digit_word_map: List[int]
 
-    def count_1478s_in_output(self) -> int:
-        counter = 0
-        for word in self.raw_output_characters:
-            if len(word) in [2, 3, 4, 7]:
-                counter += 1
-        return counter
+    def __init__(self, line: str) -> None:
+        left_side, right_side = line.split("|")
+        self.digit_masks = bytes(word_to_mask(word) for word in left_side.split())
+        self.output_masks = bytes(word_to_mask(word) for word in right_side.split())
+        self.digit_word_map = [0] * 10
 
     def _identify_numbers(self) -> None:
-        words_left = self.raw_digit_characters
+        words_left = list(self.digit_masks)
+        digits = self.digit_word_map
+
+        def take(condition) -> int:
+            mask = next(x for x in words_left if condition(x))
+            words_left.remove(mask)
+            return mask
+
         # by count
-        self.digit_word_map[1] = next(x for x in words_left if len(x) == 2)
-        words_left.remove(self.digit_word_map[1])
-        self.digit_word_map[4] = next(x for x in words_left if len(x) == 4)
-        words_left.remove(self.digit_word_map[4])
-        self.digit_word_map[7] = next(x for x in words_left if len(x) == 3)
-        words_left.remove(self.digit_word_map[7])
-        self.digit_word_map[8] = next(x for x in words_left if len(x) == 7)
-        words_left.remove(self.digit_word_map[8])
+        digits[1] = take(lambda x: x.bit_count() == 2)
+        digits[4] = take(lambda x: x.bit_count() == 4)
+        digits[7] = take(lambda x: x.bit_count() == 3)
+        digits[8] = take(lambda x: x.bit_count() == 7)
 
         # by count and containment rules
         # 6 is the only number which is length 6 and does not contain all segments of 1
-        self.digit_word_map[6] = next(
-            x
-            for x in words_left
-            if len(x) == 6 and not self.digit_word_map[1].issubset(x)
-        )
-        words_left.remove(self.digit_word_map[6])
-
+        digits[6] = take(lambda x: x.bit_count() == 6 and not is_subset(digits[1], x))
         # 0 is the only number left which is length 6 and does not contain all segments of 4
-        self.digit_word_map[0] = next(
-            x
-            for x in words_left
-            if len(x) == 6 and not self.digit_word_map[4].issubset(x)
-        )
-        words_left.remove(self.digit_word_map[0])
-
+        digits[0] = take(lambda x: x.bit_count() == 6 and not is_subset(digits[4], x))
         # 9 is the only number left which is length 6 (and does contain all segments of 4)
-        self.digit_word_map[9] = next(
-            x for x in words_left if len(x) == 6 and self.digit_word_map[4].issubset(x)
-        )
-        words_left.remove(self.digit_word_map[9])
-
+        digits[9] = take(lambda x: x.bit_count() == 6)
         # 3 is the only number left which is length 5 and does contain all segments of 1
-        self.digit_word_map[3] = next(
-            x for x in words_left if len(x) == 5 and self.digit_word_map[1].issubset(x)
-        )
-        words_left.remove(self.digit_word_map[3])
-
-        # 5 is the only number left which is length 5 and which segment difference to the segments of 6 is 1
-        self.digit_word_map[5] = next(
-            x
-            for x in words_left
-            if len(x) == 5
-            and sum([elem not in x for elem in self.digit_word_map[6]]) == 1
-        )
-        words_left.remove(self.digit_word_map[5])
-
+        digits[3] = take(lambda x: x.bit_count() == 5 and is_subset(digits[1], x))
+        # 5 is the only number left which is length 5 and lies within the segments of 6
+        digits[5] = take(lambda x: x.bit_count() == 5 and is_subset(x, digits[6]))
         # 2 is the only number left now
-        self.digit_word_map[2] = words_left.pop()
+        digits[2] = words_left.pop()
 
     def decode_output(self) -> List[int]:
         self._identify_numbers()
-        result = []
-        for output_code in self.raw_output_characters:
-            result.append(
-                next(i for i, x in self.digit_word_map.items() if x == output_code)
+        return [self.digit_word_map.index(mask) for mask in self.output_masks]
+
+
+def count_1478_masks(output_masks: numpy.ndarray) -> int:
+    return int(numpy.isin(POPCOUNT[output_masks], [2, 3, 4, 7]).sum())
+
+
+@functools.lru_cache(maxsize=None)
+def get_wiring_table() -> Dict[FrozenSet[int], Dict[int, int]]:
+    # All 5040 wirings, keyed by their set of ten pattern masks (so the order of
+    # patterns and of characters in a pattern does not matter).
+    table = {}
+    for wiring in itertools.permutations(SEGMENTS):
+        translation = str.maketrans(SEGMENTS, "".join(wiring))
+        words = {
+            word_to_mask(segments.translate(translation)): digit
+            for digit, segments in enumerate(DIGIT_SEGMENTS)
+        }
+        table[frozenset(words)] = words
+    return table
+
+
+def decode_line(line: str) -> Tuple[int, int]:
+    # returns the amount of 1478 in the output and the decoded output number
+    left_side, right_side = line.split("|")
+    words = get_wiring_table()[frozenset(word_to_mask(x) for x in left_side.split())]
+    output_words = right_side.split()
+    count_1478s = sum(len(word) in [2, 3, 4, 7] for word in output_words)
+    return count_1478s, int(
+        "".join(str(words[word_to_mask(word)]) for word in output_words)
+    )
+
+
+class GlyphSolver:
+    # Finds the wiring for any display, given the true segment mask of every glyph.
+    # Every scrambled wire starts with the true segments whose signature (in how many
+    # glyphs it appears and the lengths of those glyphs) matches its own. Patterns
+    # can only show glyphs of their length, which narrows the wires further until
+    # nothing changes. If wires are still ambiguous we guess and backtrack.
+    glyph_masks: List[int]
+    segment_count: int
+    segment_signatures: Dict[Tuple[int, ...], int]
+    # solutions per canonical pattern set, and per exact pattern set as shortcut
+    cache: Dict[Tuple[int, ...], Optional[Dict[int, int]]]
+    exact_cache: Dict[FrozenSet[int], Optional[Dict[int, int]]]
+
+    def __init__(self, glyph_masks: List[int]) -> None:
+        self.glyph_masks = glyph_masks
+        self.segment_count = max(glyph_masks).bit_length()
+        self.segment_signatures = {}
+        for segment in range(self.segment_count):
+            signature = self.get_signature(glyph_masks, segment)
+            self.segment_signatures[signature] = self.segment_signatures.get(
+                signature, 0
+            ) | (1 << segment)
+        self.cache = {}
+        self.exact_cache = {}
+
+    @staticmethod
+    def get_signature(masks: List[int], segment: int) -> Tuple[int, ...]:
+        return tuple(sorted(x.bit_count() for x in masks if x & (1 << segment)))
+
+    @staticmethod
+    def relabel(pattern: int, order: List[int]) -> int:
+        # wire order[i] of the pattern becomes wire i
+        return sum(
+            1 << index for index, wire in enumerate(order) if pattern >> wire & 1
+        )
+
+    def canonicalize(self, patterns: List[int]) -> Tuple[Tuple[int, ...], List[int]]:
+        # The same display under another scrambling only differs by a permutation of
+        # the wires. Ordering the wires by signature and taking the smallest relabeled
+        # pattern set among the orders of wires with equal signatures gives both the
+        # same cache key. Any order gives a correct key, with too many ties (more than
+        # CANONICAL_ORDERS orders) only some equal displays share it.
+        width = max(self.segment_count, max(patterns, default=0).bit_length())
+        signatures = [self.get_signature(patterns, wire) for wire in range(width)]
+        groups = [
+            [wire for _, wire in group]
+            for _, group in itertools.groupby(
+                sorted(zip(signatures, range(width))), key=lambda x: x[0]
             )
+        ]
+        best_key, best_order = None, None
+        for orders in itertools.islice(
+            itertools.product(*[itertools.permutations(x) for x in groups]),
+            CANONICAL_ORDERS,
+        ):
+            order = [wire for group in orders for wire in group]
+            key = tuple(sorted({self.relabel(x, order) for x in patterns}))
+            if best_key is None or key < best_key:
+                best_key, best_order = key, order
+        return best_key, best_order
+
+    def solve(self, patterns: List[int]) -> Optional[Dict[int, int]]:
+        # returns pattern mask -> glyph index, None if no wiring explains the patterns
+        exact_key = frozenset(patterns)
+        if exact_key in self.exact_cache:
+            return self.exact_cache[exact_key]
+
+        key, order = self.canonicalize(patterns)
+        if key not in self.cache:
+            self.cache[key] = self._solve(list(key))
+        glyphs = self.cache[key]
+        if glyphs is not None:
+            glyphs = {x: glyphs[self.relabel(x, order)] for x in exact_key}
+        self.exact_cache[exact_key] = glyphs
+        return glyphs
+
+    def _solve(self, patterns: List[int]) -> Optional[Dict[int, int]]:
+        if len(patterns) != len(self.glyph_masks):
+            return None
+        candidates = [
+            self.segment_signatures.get(self.get_signature(patterns, wire), 0)
+            for wire in range(self.segment_count)
+        ]
+        wiring = self._search(patterns, candidates)
+        if wiring is None:
+            return None
+        return {
+            pattern: self.glyph_masks.index(self.apply_wiring(pattern, wiring))
+            for pattern in patterns
+        }
+
+    @staticmethod
+    def apply_wiring(pattern: int, wiring: List[int]) -> int:
+        result = 0
+        for wire, segment_mask in enumerate(wiring):
+            if pattern & (1 << wire):
+                result |= segment_mask
         return result
 
+    def _propagate(self, patterns: List[int], candidates: List[int]) -> bool:
+        # narrows the candidates in place, returns False on a contradiction
+        all_segments = (1 << self.segment_count) - 1
+        changed = True
+        while changed:
+            changed = False
+            for pattern in patterns:
+                glyphs = [
+                    glyph
+                    for glyph in self.glyph_masks
+                    if glyph.bit_count() == pattern.bit_count()
+                    and all(
+                        candidates[wire] & (glyph if pattern & (1 << wire) else ~glyph)
+                        for wire in range(self.segment_count)
+                    )
+                ]
+                if len(glyphs) == 0:
+                    return False
+                lit, unlit = 0, 0
+                for glyph in glyphs:
+                    lit |= glyph
+                    unlit |= all_segments & ~glyph
+                for wire in range(self.segment_count):
+                    allowed = lit if pattern & (1 << wire) else unlit
+                    if candidates[wire] & ~allowed:
+                        candidates[wire] &= allowed
+                        changed = True
+
+            # a wire with only one segment left takes it away from all other wires
+            for wire, candidate in enumerate(candidates):
+                if candidate == 0:
+                    return False
+                if candidate.bit_count() != 1:
+                    continue
+                for other in range(self.segment_count):
+                    if other != wire and candidates[other] & candidate:
+                        candidates[other] &= ~candidate
+                        changed = True
+        return True
+
+    def _search(
+        self, patterns: List[int], candidates: List[int]
+    ) -> Optional[List[int]]:
+        candidates = list(candidates)
+        if not self._propagate(patterns, candidates):
+            return None
+        open_wires = [
+            x for x in range(self.segment_count) if candidates[x].bit_count() > 1
+        ]
+        if len(open_wires) == 0:
+            glyphs = {self.apply_wiring(pattern, candidates) for pattern in patterns}
+            return candidates if glyphs == set(self.glyph_masks) else None
+
+        wire = min(open_wires, key=lambda x: candidates[x].bit_count())
+        for segment in range(self.segment_count):
+            if candidates[wire] & (1 << segment):
+                guess = list(candidates)
+                guess[wire] = 1 << segment
+                wiring = self._search(patterns, guess)
+                if wiring is not None:
+                    return wiring
+        return None
+
+
+def main_solver():
+    solver = GlyphSolver([word_to_mask(x) for x in DIGIT_SEGMENTS])
+    count_1478s, sum_total = 0, 0
+    with open(filename, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            left_side, right_side = line.split("|")
+            glyphs = solver.solve([word_to_mask(x) for x in left_side.split()])
+            output_masks = [word_to_mask(x) for x in right_side.split()]
+            if glyphs is None or any(x not in glyphs for x in output_masks):
+                logging.warning(f"Skipping undecodable line: {line.strip()}")
+                continue
+            digits = [glyphs[x] for x in output_masks]
+            count_1478s += sum(x in [1, 4, 7, 8] for x in digits)
+            sum_total += int("".join(str(x) for x in digits))
+
+    logging.info(f"Amount of 1478 in output digits: {count_1478s}")
+    logging.info(f"Sum of all decoded output digits: {sum_total}")
+
+
+def main_lookup():
+    get_wiring_table()  # build it once before the workers are forked
+    count_1478s, sum_total = 0, 0
+    with open(filename, "r") as f, Pool() as pool:
+        lines = (line for line in f if line.strip())
+        for count, number in pool.imap(decode_line, lines, chunksize=1024):
+            count_1478s += count
+            sum_total += number
+
+    logging.info(f"Amount of 1478 in output digits: {count_1478s}")
+    logging.info(f"Sum of all decoded output digits: {sum_total}")
+
 
 def main():
+    if mode == "lookup":
+        main_lookup()
+        return
+    elif mode == "solver":
+        main_solver()
+        return
+
     with open(filename, "r") as f:
         # parse input
-        decodings = [Decoder(line.strip()) for line in f.readlines()]
+        decodings = [Decoder(line.strip()) for line in f.readlines() if line.strip()]
 
         # part1
+        output_masks = numpy.frombuffer(
+            b"".join(d.output_masks for d in decodings), dtype=numpy.uint8
+        )
         logging.info(
-            f"Amount of 1478 in output digits: {sum([d.count_1478s_in_output() for d in decodings])}"
+            f"Amount of 1478 in output digits: {count_1478_masks(output_masks)}"
         )
 
         # part2
         sum_total = 0
         for index, decoder in enumerate(decodings):
             result = decoder.decode_output()
-            mappings = {i: "".join(word) for i, word in decoder.digit_word_map.items()}
+            mappings = {
+                i: mask_to_word(x) for i, x in enumerate(decoder.digit_word_map)
+            }
             logging.debug(f"{index} Identified number mappings: {mappings}")
             logging.debug(f"{index} Decoded output numbers: {result}")
             sum_total += int("".join([str(x) for x in result]))
@@ -126,4 +355,5 @@ def main():
         logging.info(f"Sum of all decoded output digits: {sum_total}")
 
 
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 from __future__ import annotations
-import sys, os
-import logging
+import sys, os, numpy, itertools
+import logging, heapq, math
+from collections import deque
+from multiprocessing import Pool
 from typing import Dict, Generator, List, Tuple
 
 logging.basicConfig(format="%(message)s", level=logging.INFO)
@@ -13,12 +15,65 @@ filename = (
     if len(sys.argv) > 1
     else os.path.join(os.path.dirname(os.path.abspath(__file__)), "testinput")
 )
+mode = sys.argv[2] if len(sys.argv) > 2 else "lists"
 DIRECTIONS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+BLOCK_ROWS = 1024
+TILE_SIZE = 1024
+TOP_BASINS = 3
+
+
+def label_basins(heights: List[int], width: int) -> Tuple[List[int], List[int]]:
+    # Every connected area of heights below 9 is one basin, so one BFS per area
+    # labels all of them. Takes the heights row by row and returns the flat labels
+    # (0 for height 9) and the size per basin label (label 1 at index 0).
+    labels = [0] * len(heights)
+    sizes = []
+    for start, start_height in enumerate(heights):
+        if start_height >= 9 or labels[start] != 0:
+            continue
+        label = len(sizes) + 1
+        labels[start] = label
+        size = 0
+        queue = deque([start])
+        while len(queue) > 0:
+            index = queue.popleft()
+            size += 1
+            x = index % width
+            for neighbor, is_inside in [
+                (index - 1, x > 0),
+                (index + 1, x < width - 1),
+                (index - width, index >= width),
+                (index + width, index + width < len(heights)),
+            ]:
+                if is_inside and heights[neighbor] < 9 and labels[neighbor] == 0:
+                    labels[neighbor] = label
+                    queue.append(neighbor)
+        sizes.append(size)
+    return labels, sizes
+
+
+class UnionFind:
+    parents: List[int]
+
+    def __init__(self, size: int) -> None:
+        self.parents = list(range(size))
+
+    def find(self, x: int) -> int:
+        while self.parents[x] != x:
+            self.parents[x] = self.parents[self.parents[x]]
+            x = self.parents[x]
+        return x
+
+    def union(self, a: int, b: int) -> None:
+        a, b = self.find(a), self.find(b)
+        if a != b:
+            self.parents[max(a, b)] = min(a, b)
 
 
 class LavaCave:
     heightmap: List[List[int]]
     coloring: List[List[int]]
+    basin_sizes: List[int]
 
     def __init__(self, lines: str) -> None:
         self.heightmap = []
@@ -54,40 +109,22 @@ class LavaCave:
         return sum([h + 1 for _, _, h in self.get_low_points()])
 
     def create_coloring(self) -> None:
-        self.coloring = [[0] * len(x) for x in self.heightmap]
-        color = 1
-        for low_x, low_y, _ in self.get_low_points():
-            self.flood_basin_with_color(color, (low_x, low_y))
-            color += 1
-
-    def flood_basin_with_color(self, color, start_pos) -> None:
-        queue = [start_pos]
-        while len(queue) > 0:
-            x, y = queue.pop(0)
-            self.coloring[y][x] = color
-            for dx, dy in DIRECTIONS:
-                if (
-                    0 <= x + dx < self.xheight()
-                    and 0 <= y + dy < self.yheight()
-                    and self.heightmap[y + dy][x + dx] < 9
-                    and self.coloring[y + dy][x + dx] <= 0
-                ):
-                    queue.append((x + dx, y + dy))
-
-    def get_basin_sizes(self) -> Generator[int]:
-        for low_x, low_y, _ in self.get_low_points():
-            color = self.coloring[low_y][low_x]
-            yield sum(
-                [
-                    self.coloring[y][x] == color
-                    for y in range(self.yheight())
-                    for x in range(self.xheight())
-                ]
-            )
+        labels, self.basin_sizes = self.label_basins()
+        width = self.xheight()
+        self.coloring = [
+            labels[y * width : (y + 1) * width] for y in range(self.yheight())
+        ]
+
+    def label_basins(self) -> Tuple[List[int], List[int]]:
+        heights = [height for row in self.heightmap for height in row]
+        return label_basins(heights, self.xheight())
+
+    def get_basin_sizes(self) -> List[int]:
+        return self.basin_sizes
 
     def get_riskfactor_by_basins(self) -> int:
-        basin_sizes = sorted(list(self.get_basin_sizes()))
-        return basin_sizes.pop() * basin_sizes.pop() * basin_sizes.pop()
+        a, b, c = heapq.nlargest(3, self.basin_sizes)
+        return a * b * c
 
     def __str__(self) -> str:
         text = ""
@@ -101,7 +138,131 @@ class LavaCave:
         return text
 
 
+def load_heightmap(filename: str) -> numpy.ndarray:
+    # Memory maps the input file itself as (rows, width) uint8 array of ascii digits,
+    # skipping the line endings (\n or \r\n) by striding. Comparing ascii digits is the
+    # same as comparing heights, so nothing has to be converted or loaded up front.
+    raw = numpy.memmap(filename, dtype=numpy.uint8, mode="r")
+    width = len(raw)
+    for start in range(0, len(raw), 65536):
+        newlines = numpy.flatnonzero(raw[start : start + 65536] == ord("\n"))
+        if len(newlines) > 0:
+            width = start + int(newlines[0])
+            break
+    line_ending = 2 if width > 0 and raw[width - 1] == ord("\r") else 1
+    width -= line_ending - 1
+
+    # all rows need the same width for the striding, the last line ending is optional
+    rows, rest = divmod(len(raw) + line_ending, width + line_ending)
+    if rest not in [0, line_ending]:
+        raise Exception("heightmap rows differ in width")
+    return numpy.lib.stride_tricks.as_strided(
+        raw, shape=(rows, width), strides=(width + line_ending, 1), writeable=False
+    )
+
+
+def get_low_point_mask(heights: numpy.ndarray) -> numpy.ndarray:
+    # a cell outside the map counts as 9, so cells of height 9 are never low points
+    low = heights < ord("9")
+    low[1:] &= heights[1:] < heights[:-1]
+    low[:-1] &= heights[:-1] < heights[1:]
+    low[:, 1:] &= heights[:, 1:] < heights[:, :-1]
+    low[:, :-1] &= heights[:, :-1] < heights[:, 1:]
+    return low
+
+
+def get_riskfactor_numpy(heights: numpy.ndarray, block_rows: int = BLOCK_ROWS) -> int:
+    # rows in blocks with one row of overlap on each side, so memory stays bounded
+    riskfactor = 0
+    for y0 in range(0, len(heights), block_rows):
+        top = max(y0 - 1, 0)
+        block = numpy.asarray(heights[top : y0 + block_rows + 1])
+        low = get_low_point_mask(block)[y0 - top : y0 - top + block_rows]
+        values = block[y0 - top : y0 - top + block_rows]
+        riskfactor += int(values[low].sum(dtype=numpy.int64)) - len(values[low]) * (
+            ord("0") - 1
+        )
+    return riskfactor
+
+
+def label_tile(
+    args: Tuple[str, int, int, int],
+) -> Tuple[List[int], List[int], List[int], List[int], List[int]]:
+    # labels one tile on its own, returns its basin sizes and the labels along its
+    # top, bottom, left and right edge for stitching
+    filename, y0, x0, tile_size = args
+    tile = load_heightmap(filename)[y0 : y0 + tile_size, x0 : x0 + tile_size]
+    height, width = tile.shape
+    labels, sizes = label_basins((tile - ord("0")).ravel().tolist(), width)
+    return (
+        sizes,
+        labels[:width],
+        labels[(height - 1) * width :],
+        labels[::width],
+        labels[width - 1 :: width],
+    )
+
+
+def get_basin_sizes_tiled(
+    filename: str, tile_size: int = TILE_SIZE, processes: int = None
+) -> List[int]:
+    rows, width = load_heightmap(filename).shape
+    tile_origins = list(
+        itertools.product(range(0, rows, tile_size), range(0, width, tile_size))
+    )
+    with Pool(processes) as pool:
+        tiles = dict(
+            zip(
+                tile_origins,
+                pool.imap(
+                    label_tile,
+                    [(filename, y0, x0, tile_size) for y0, x0 in tile_origins],
+                ),
+            )
+        )
+
+    # local label l of a tile becomes global label offset + l - 1
+    offsets = {}
+    label_count = 0
+    for origin in tile_origins:
+        offsets[origin] = label_count
+        label_count += len(tiles[origin][0])
+
+    # basins touching across a tile edge are the same basin
+    union_find = UnionFind(label_count)
+    for (y0, x0), (_, _, bottom, _, right) in tiles.items():
+        for neighbor, edge, neighbor_edge in [
+            ((y0 + tile_size, x0), bottom, 1),
+            ((y0, x0 + tile_size), right, 3),
+        ]:
+            if neighbor not in tiles:
+                continue
+            for a, b in zip(edge, tiles[neighbor][neighbor_edge]):
+                if a != 0 and b != 0:
+                    union_find.union(
+                        offsets[(y0, x0)] + a - 1, offsets[neighbor] + b - 1
+                    )
+
+    sizes = {}
+    for origin in tile_origins:
+        for index, size in enumerate(tiles[origin][0]):
+            root = union_find.find(offsets[origin] + index)
+            sizes[root] = sizes.get(root, 0) + size
+    return list(sizes.values())
+
+
 def main():
+    if mode == "tiled":
+        basin_sizes = get_basin_sizes_tiled(filename)
+        logging.info(f"Amount of basins: {len(basin_sizes)}")
+        logging.info(
+            f"Riskfactor by top {TOP_BASINS} basin sizes: {math.prod(heapq.nlargest(TOP_BASINS, basin_sizes))}"
+        )
+        return
+    elif mode == "numpy":
+        logging.info(f"Lowpoint sum: {get_riskfactor_numpy(load_heightmap(filename))}")
+        return
+
     with open(filename, "r") as f:
         # parse input
         cave = LavaCave(f.readlines())
@@ -117,4 +278,5 @@ def main():
         )
 
 
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
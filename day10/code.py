@@ -1,7 +1,8 @@
 from __future__ import annotations
-import sys, os
+import sys, os, numpy, itertools
 import logging
-from typing import Dict, Generator, List, Tuple
+from multiprocessing import Pool
+from typing import Dict, Generator, List, TextIO, Tuple
 from collections import Counter
 import statistics, math
 
@@ -12,6 +13,9 @@ filename = (
     if len(sys.argv) > 1
     else os.path.join(os.path.dirname(os.path.abspath(__file__)), "testinput")
 )
+mode = sys.argv[2] if len(sys.argv) > 2 else "serial"
+BATCH_LINES = 4096
+UINT64_LIMIT = 2**64 - 1
 OPENPAREN = ["[", "{", "(", "<"]
 CLOSEPAREN = {"[": "]", "{": "}", "(": ")", "<": ">"}
 PAREN_SYNTAX_SCORE = {")": 3, "]": 57, "}": 1197, ">": 25137}
@@ -32,69 +36,35 @@ class InvalidOpenParenthesisError(Exception):
         return f"{self.character} -> {self.message}"
 
 
-class InvalidCloseParenthesisError(Exception):
-    def __init__(
-        self,
-        open_character: str,
-        close_character: str,
-        message="invalid closing parenthesis found for the used open parenthesis",
-    ):
-        self.open_character = open_character
-        self.close_character = close_character
-        self.message = message
-        super().__init__(self.message)
-
-    def __str__(self):
-        return f"{self.open_character} - {self.close_character} -> {self.message}"
-
-
-class IncompleteLineError(Exception):
-    def __init__(
-        self,
-        missing_parens: List[str],
-        message="line ended prematurely",
-    ):
-        self.message = message
-        self.missing_parens = missing_parens
-        super().__init__(self.message)
-
-
-def parse_one_chunk(input: List[str], closing_list: List[str]):
-    if len(input) == 0 or input[0] in CLOSEPAREN.values():
-        return
-
-    open_paren = input.pop(0)
-    closing_list.insert(0, CLOSEPAREN[open_paren])
-
-    if open_paren not in OPENPAREN:
-        raise InvalidOpenParenthesisError(open_paren)
-
-    while len(input) > 0 and input[0] in OPENPAREN:
-        parse_one_chunk(input, closing_list)
+def validate_line(line: str) -> Tuple[int, int]:
+    # returns (syntax score, completion score), one of them is always 0
+    expected_closing = []
+    for character in line:
+        if character in CLOSEPAREN:
+            expected_closing.append(CLOSEPAREN[character])
+        elif character in PAREN_SYNTAX_SCORE:
+            if len(expected_closing) == 0 or expected_closing.pop() != character:
+                logging.debug(
+                    f"Error: {character}, Score {PAREN_SYNTAX_SCORE[character]}"
+                )
+                return (PAREN_SYNTAX_SCORE[character], 0)
+        else:
+            raise InvalidOpenParenthesisError(character)
 
-    if len(input) == 0:
-        raise IncompleteLineError(closing_list)
-
-    close_paren = input.pop(0)
-    closing_list.pop(0)
-    if close_paren != CLOSEPAREN[open_paren]:
-        raise InvalidCloseParenthesisError(open_paren, close_paren)
-
-
-def parse_chunks(input: List[str]) -> Tuple[int, int]:
-    logging.debug(f"Line: {input}")
-    try:
-        while len(input) > 0:
-            parse_one_chunk(input, [])
-    except IncompleteLineError as e:
-        logging.debug(f"Incomplete line can be completed with {e.missing_parens}\n")
-        return (0, calculate_completion_score(e.missing_parens))
-    except InvalidCloseParenthesisError as e:
-        logging.debug(f"Error: {e}, Score {PAREN_SYNTAX_SCORE[e.close_character]}\n")
-        return (PAREN_SYNTAX_SCORE[e.close_character], 0)
+    expected_closing.reverse()
+    logging.debug("Incomplete line can be completed with %s", expected_closing)
+    return (0, calculate_completion_score(expected_closing))
 
 
 def calculate_completion_score(input: List[str]) -> int:
+    # the score is a base 5 number, for long completions the halves are combined
+    # so the big int multiplications stay subquadratic
+    if len(input) > 256:
+        middle = len(input) // 2
+        return calculate_completion_score(input[:middle]) * 5 ** (
+            len(input) - middle
+        ) + calculate_completion_score(input[middle:])
+
     score = 0
     for x in input:
         score *= 5
@@ -102,13 +72,62 @@ def calculate_completion_score(input: List[str]) -> int:
     return score
 
 
+def read_batches(f: TextIO, batch_lines: int) -> Generator[List[str]]:
+    while True:
+        batch = list(itertools.islice(f, batch_lines))
+        if len(batch) == 0:
+            return
+        yield batch
+
+
+def validate_batch(lines: List[str]) -> Tuple[int, numpy.ndarray]:
+    syntax_score = 0
+    completion_scores = []
+    for line in lines:
+        sscore, cscore = validate_line(line.strip())
+        syntax_score += sscore
+        if cscore != 0:
+            completion_scores.append(cscore)
+
+    # completion scores of deeply nested lines do not fit into 64 bit
+    dtype = (
+        numpy.uint64 if max(completion_scores, default=0) <= UINT64_LIMIT else object
+    )
+    return syntax_score, numpy.array(completion_scores, dtype=dtype)
+
+
+def validate_corpus(
+    filename: str, batch_lines: int = BATCH_LINES, processes: int = None
+) -> Tuple[int, numpy.ndarray]:
+    syntax_score = 0
+    completion_scores = []
+    with open(filename, "r") as f, Pool(processes) as pool:
+        for sscore, cscores in pool.imap(validate_batch, read_batches(f, batch_lines)):
+            syntax_score += sscore
+            completion_scores.append(cscores)
+    if len(completion_scores) == 0:
+        return syntax_score, numpy.array([], dtype=numpy.uint64)
+    return syntax_score, numpy.concatenate(completion_scores)
+
+
+def median_low(scores: numpy.ndarray) -> int:
+    # selection instead of sorting, linear on average
+    middle = (len(scores) - 1) // 2
+    return int(numpy.partition(scores, middle)[middle])
+
+
 def main():
+    if mode == "parallel":
+        syntax_score, completion_scores = validate_corpus(filename)
+        logging.info(f"Total syntax error score: {syntax_score}")
+        logging.info(f"Total autocompletion score: {median_low(completion_scores)}")
+        return
+
     with open(filename, "r") as f:
         syntax_score = 0
         completion_score = []
         for line in f.readlines():
-            characters = list(line.strip())
-            sscore, cscore = parse_chunks(characters)
+            sscore, cscore = validate_line(line.strip())
             syntax_score += sscore
             if cscore != 0:
                 completion_score.append(cscore)
@@ -119,4 +138,5 @@ def main():
         )
 
 
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 from __future__ import annotations
-import sys, os
+import sys, os, numpy
 import logging
-from typing import Dict, Generator, List, Tuple
+from typing import Generator, List, Optional, Tuple
 from collections import Counter
 import statistics, math
 
@@ -12,80 +12,155 @@ filename = (
     if len(sys.argv) > 1
     else os.path.join(os.path.dirname(os.path.abspath(__file__)), "testinput")
 )
+mode = sys.argv[2] if len(sys.argv) > 2 else "single"
+FLASH_STEPS = 100
+# fields that never synchronize are given up on after this many steps in batch mode
+MAX_STEPS = int(sys.argv[3]) if len(sys.argv) > 3 else 10000
 COLORS_RED = "\x1b[38;5;9m"
 COLOR_RESET = "\x1b[0m"
 DIRECTIONS = [(-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1)]
 
 
 class OctopusField:
-    grid: Dict[Tuple[int, int], int]
+    energy: List[int]
+    neighbors: List[List[int]]
     width: int
     height: int
 
     def __init__(self, input: List[str]) -> None:
-        self.grid = {}
-        self.width = 0
-        self.height = 0
-        for y, line in enumerate(input):
-            for x, number in enumerate(list(line.strip())):
-                self.grid[(x, y)] = int(number)
-                self.height = max(self.height, y)
-            self.width = max(self.width, x)
-        self.width += 1
-        self.height += 1
+        rows = [line.strip() for line in input if line.strip()]
+        self.width = len(rows[0])
+        self.height = len(rows)
+        # flat row by row, neighbor indices are computed once instead of per flash
+        self.energy = [int(number) for line in rows for number in line]
+        self.neighbors = [
+            [
+                (y + dy) * self.width + x + dx
+                for dx, dy in DIRECTIONS
+                if 0 <= x + dx < self.width and 0 <= y + dy < self.height
+            ]
+            for y in range(self.height)
+            for x in range(self.width)
+        ]
 
     def step(self) -> int:
-        blacklist = {pos: False for pos in self.grid.keys()}
+        energy = self.energy
+        worklist = []
+        for index in range(len(energy)):
+            energy[index] += 1
+            if energy[index] == 10:
+                worklist.append(index)
+
+        # every octopus enters the worklist exactly when it passes 9, so it flashes once
         count_flashes = 0
-
-        self.increase_all()
-        while self.are_any_octopus_flashing(blacklist):
-            count_flashes += self.flash_once(blacklist)
-        self.reset_octopus()
-
+        while len(worklist) > 0:
+            count_flashes += 1
+            for neighbor in self.neighbors[worklist.pop()]:
+                energy[neighbor] += 1
+                if energy[neighbor] == 10:
+                    worklist.append(neighbor)
+
+        for index in range(len(energy)):
+            if energy[index] > 9:
+                energy[index] = 0
         return count_flashes
 
-    def increase_all(self):
-        for pos in self.grid.keys():
-            self.grid[pos] += 1
-
-    def reset_octopus(self):
-        for pos in [pos for pos, x in self.grid.items() if x > 9]:
-            self.grid[pos] = 0
-
-    def positions_flashing(
-        self, blacklist: List[Tuple[int, int], bool]
-    ) -> List[Tuple[int, int]]:
-        return [pos for pos, x in self.grid.items() if not blacklist[pos] and x > 9]
-
-    def are_any_octopus_flashing(self, blacklist: List[Tuple[int, int], bool]):
-        return len(self.positions_flashing(blacklist)) > 0
-
-    def flash_once(self, blacklist: List[Tuple[int, int], bool]) -> int:
-        pos_flashing = self.positions_flashing(blacklist)
-        for pos in pos_flashing:
-            blacklist[pos] = True
-            for d in DIRECTIONS:
-                if 0 <= pos[0] + d[0] < self.width and 0 <= pos[1] + d[1] < self.height:
-                    self.grid[(pos[0] + d[0], pos[1] + d[1])] += 1
-        return len(pos_flashing)
-
     def have_octopus_flashed_synchronized(self) -> bool:
-        return all(x == 0 for _, x in self.grid.items())
+        return all(x == 0 for x in self.energy)
 
     def __str__(self) -> str:
         text = ""
         for y in range(self.height):
             for x in range(self.width):
+                energy = self.energy[y * self.width + x]
                 color = ""
-                if self.grid[(x, y)] == 0:
+                if energy == 0:
                     color = COLORS_RED
-                text = f"{text}{color}{self.grid[(x,y)]}{COLOR_RESET}"
+                text = f"{text}{color}{energy}{COLOR_RESET}"
             text = f"{text}\n"
         return text
 
 
+def count_neighbor_flashes(flashing: numpy.ndarray) -> numpy.ndarray:
+    # sum of the 8 shifted flash masks, cells outside the fields never flash
+    padded = numpy.pad(flashing, ((0, 0), (1, 1), (1, 1))).astype(numpy.uint8)
+    _, height, width = flashing.shape
+    counts = numpy.zeros(flashing.shape, dtype=numpy.uint8)
+    for dx, dy in DIRECTIONS:
+        counts += padded[:, 1 + dy : 1 + dy + height, 1 + dx : 1 + dx + width]
+    return counts
+
+
+def simulate_fields(
+    fields: numpy.ndarray,
+    flash_steps: int = FLASH_STEPS,
+    max_steps: Optional[int] = None,
+) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    # Simulates a (B, H, W) stack of fields together. Returns the flashes per field
+    # after flash_steps steps and the first step each field synchronized in (-1 if
+    # not within max_steps). Fields leave the active stack once both are known.
+    energy = numpy.array(fields, dtype=numpy.uint8)
+    active = numpy.arange(len(energy))
+    flash_counts = numpy.zeros(len(energy), dtype=numpy.int64)
+    synchronized_steps = numpy.full(len(energy), -1, dtype=numpy.int64)
+
+    # the flashes are always counted for flash_steps, even with fewer max_steps
+    last_step = None if max_steps is None else max(max_steps, flash_steps)
+    step = 0
+    while len(active) > 0 and (last_step is None or step < last_step):
+        step += 1
+        energy += 1
+        # a cell reaches at most 10 + 8 neighbor flashes, so uint8 can not overflow
+        flashed = numpy.zeros(energy.shape, dtype=bool)
+        while True:
+            flashing = (energy > 9) & ~flashed
+            if not flashing.any():
+                break
+            flashed |= flashing
+            energy += count_neighbor_flashes(flashing)
+        energy[flashed] = 0
+
+        if step <= flash_steps:
+            flash_counts[active] += flashed.sum(axis=(1, 2))
+        synchronized = flashed.all(axis=(1, 2)) & (synchronized_steps[active] == -1)
+        if max_steps is not None and step > max_steps:
+            synchronized[:] = False
+        synchronized_steps[active[synchronized]] = step
+
+        keep = (synchronized_steps[active] == -1) | (step < flash_steps)
+        energy, active = energy[keep], active[keep]
+
+    return flash_counts, synchronized_steps
+
+
+def parse_fields(lines: List[str]) -> numpy.ndarray:
+    # fields are separated by blank lines and all have the same size
+    fields = [[]]
+    for line in lines:
+        if line.strip():
+            fields[-1].append([int(x) for x in line.strip()])
+        elif len(fields[-1]) > 0:
+            fields.append([])
+    return numpy.array([x for x in fields if len(x) > 0], dtype=numpy.uint8)
+
+
 def main():
+    if mode == "batch":
+        with open(filename, "r") as f:
+            flash_counts, synchronized_steps = simulate_fields(
+                parse_fields(f.readlines()), max_steps=MAX_STEPS
+            )
+        for index, (flashes, step) in enumerate(zip(flash_counts, synchronized_steps)):
+            synchronized = (
+                f"SYNCHRONIZED at step {step}"
+                if step >= 0
+                else f"not synchronized within {MAX_STEPS} steps"
+            )
+            logging.info(
+                f"Field {index}: {flashes} flashes after {FLASH_STEPS} steps, {synchronized}"
+            )
+        return
+
     with open(filename, "r") as f:
         field = OctopusField(f.readlines())
         flashes = 0
@@ -102,4 +177,4 @@ def main():
         logging.info(f"Field at {x} ({flashes} flashes, SYNCHRONIZED):\n{field}")
 
 
-main()
\ No newline at end of file
+main()